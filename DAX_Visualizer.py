@@ -8,163 +8,225 @@
 # 2. "streamlit run DAX_Visualizer.py"
 
 
+import base64
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import yfinance as yf
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
+from indicators import dual_sma, m4, rsi_kernel
 
-# Scraping company names and ticker symbols.
-def load_tickers(url, num=0):
-    html = pd.read_html(url)
-    table = html[num]
 
-    tickers = pd.DataFrame()
-    tickers["Company"] = table["Company"]
-    tickers["Ticker"] = table["Ticker symbol"]
+# Scraping company names and ticker symbols.
+def load_tickers(url):
+    from lxml import html
+    response = get_session().get(url, timeout=10)
+    response.raise_for_status()
+    page = html.fromstring(response.content)
+
+    # Picking the table by its header rather than its position, so other tables on the page can't shift it.
+    for table in page.xpath("//table"):
+        rows = table.xpath("./tr|./thead/tr|./tbody/tr")
+        if not rows:
+            continue
+        header = [cell.text_content().strip() for cell in rows[0].xpath("./th|./td")]
+        if "Company" in header and "Ticker symbol" in header:
+            break
+    else:
+        raise ValueError(f"No table with 'Company' and 'Ticker symbol' columns found at {url}")
+    company_col = header.index("Company")
+    ticker_col = header.index("Ticker symbol")
+
+    data = []
+    for row in rows[1:]:
+        cells = [cell.text_content().strip() for cell in row.xpath("./th|./td")]
+        if len(cells) > max(company_col, ticker_col):
+            data.append([cells[company_col], cells[ticker_col]])
+
+    tickers = pd.DataFrame(data, columns=["Company", "Ticker"])
     tickers.set_index("Company", inplace=True)
     return tickers
 
 
-# Downloading price and volume data from Yahoo Finance, adding RSI indicator to dataframe, dropping NA values.
-@st.cache(allow_output_mutation=True)
+# Keeping one shared tickers table per server process for a day, so reruns skip even the cache lookup.
+# The table is also pickled to TICKERS_FILE, so cold starts within a day skip Wikipedia.
+@st.cache_resource(ttl=86400, show_spinner=False)
+def get_tickers():
+    if os.path.exists(TICKERS_FILE) and time.time() - os.path.getmtime(TICKERS_FILE) < 86400:
+        return pd.read_pickle(TICKERS_FILE)
+    tickers = load_tickers(URL)
+    tickers.to_pickle(TICKERS_FILE)
+    return tickers
+
+
+# Sharing one keep-alive HTTP session across all Yahoo Finance requests, saving a TLS handshake per call.
+@st.cache_resource(show_spinner=False)
+def get_session():
+    from requests import Session
+    from requests.adapters import HTTPAdapter
+    session = Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return session
+
+
+# Downloading price and volume data from Yahoo Finance, dropping NA values, storing prices as float32 for the indicator kernels.
+# Volume stays integer, float32 is only exact up to 2^24 and weekly/monthly volumes go far beyond that.
+@st.cache_data(ttl=3600, show_spinner=False)
 def load_price_data(ticker, start, end, interval):
-    data = yf.download(tickers=ticker, start=start, end=end, interval=interval)
-    data[f"RSI ({rsi_periods})"] = rsi(data["Adj Close"], rsi_periods)
+    import yfinance as yf
+    data = yf.download(tickers=ticker, start=start, end=end, interval=interval,
+                       session=get_session(), progress=False, threads=False)
     data.dropna(inplace=True)
-    return data
+    data.columns = data.columns.astype(str)
+    return data.astype({column: np.float32 for column in PRICE_COLUMNS})
 
 
-# Calculating RSI indicator.
-def rsi(series, periods):
-    delta = series.diff()
-    up = delta.clip(lower=0)
-    down = -1 * delta.clip(upper=0)
-    
-    ema_up = up.ewm(com=periods-1, adjust=False).mean()
-    ema_down = down.ewm(com=periods-1, adjust=False).mean()
-    
-    rs = ema_up / ema_down
-    rsi = 100 - (100/(1+rs))
-    return rsi
+# Calculating RSI indicator on cached price data, so changing the periods never re-downloads, dropping NA values.
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_rsi(ticker, start, end, interval, periods):
+    data = load_price_data(ticker, start, end, interval)
+    return rsi(data["Adj Close"], periods).dropna()
 
 
-# Calculating simple moving averages(SMA).
-def sma(series, period):
-    sma = series.rolling(period).mean()
-    return sma
+# Converting a column to the contiguous float32 array the kernels are compiled for.
+def as_float32(series):
+    return np.ascontiguousarray(series.to_numpy(dtype=np.float32))
 
 
-# Downloading data on major holders from Yahoo Finance.
-@st.cache(allow_output_mutation=True)
-def load_major_holders(ticker):
-    stock = yf.Ticker(ticker)
-    return stock.major_holders
+# Calculating RSI indicator.
+def rsi(series, periods):
+    rsi = rsi_kernel(as_float32(series), periods)
+    return pd.Series(rsi, index=series.index)
+
 
+# Selecting the rows worth plotting, short series are returned untouched.
+def downsample(y, edges=True):
+    if y.size < 4*FIG_WIDTH_PX:
+        return slice(None)
+    return m4(y, FIG_WIDTH_PX, edges)
 
-# Downloading data on institutional holders from Yahoo Finance.
-@st.cache(allow_output_mutation=True)
-def load_institutional_holders(ticker):
-    stock = yf.Ticker(ticker)
-    institutional_holders = stock.institutional_holders
-    institutional_holders.drop(columns="Value", inplace=True)
-    return institutional_holders
+
+# Downloading data on major and institutional holders from Yahoo Finance, parsing major holders percentages.
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_holders(ticker):
+    import yfinance as yf
+    stock = yf.Ticker(ticker, session=get_session())
+    major_holders = stock.major_holders
+    major_holders = np.fromiter((float(major_holders[0][i][:-1]) for i in range(3)), dtype=np.float64, count=3)
+    institutional_holders = stock.institutional_holders.loc[:, INSTITUTIONAL_HOLDERS_COLUMNS]
+    return major_holders, institutional_holders
 
 
 # Converting selectbox input for load_price_data().
 def convert_interval(interval):
-    interval = "1d" if interval == "1 day" else interval
-    interval = "1wk" if interval == "1 week" else interval
-    interval = "1mo" if interval == "1 month" else interval
-    return interval
+    return INTERVALS.get(interval, interval)
+
+
+# Reusing one cleared figure per session instead of building a new one on every rerun.
+def get_figure(key, figsize):
+    if key not in st.session_state:
+        from matplotlib.figure import Figure
+        st.session_state[key] = Figure(figsize=figsize, dpi=DPI)
+    fig = st.session_state[key]
+    fig.clear()
+    return fig
 
 
-# Creating price chart and subplots.
-def plot_price(price_data):
+# Creating price chart with matplotlib, RSI and volume charts with Altair (Vega-Lite, sent over Arrow).
+def plot_price(price_data, rsi_data):
+    import altair as alt
     df = price_data
-    df["Date"] = df.index
+    adj_close = as_float32(df["Adj Close"])
+    price_idx = downsample(adj_close)
 
-    plt.figure(figsize=(12,8))
-    
-    ax1 = plt.subplot(14, 1, (1,7))
-    ax1.plot(df.index, df["Adj Close"], color="lightgray", linewidth=2, label="Adj. Close")
+    fig = get_figure("price_fig", FIGSIZE)
+    ax1 = fig.add_subplot()
+    ax1.plot(df.index[price_idx], adj_close[price_idx], color="lightgray", linewidth=2, label="Adj. Close")
+    ax1.set_xlim(df.index[0], df.index[-1])
     ax1.grid(True, color="#555555")
     ax1.set_facecolor("black")
-    ax1.figure.set_facecolor("#121212")
+    fig.set_facecolor("#121212")
     ax1.tick_params(axis="x", colors="white")
     ax1.tick_params(axis="y", colors="white")
   
+    sma_1_plot, sma_2_plot = dual_sma(adj_close, sma_1_periods if sma_1 else 0, sma_2_periods if sma_2 else 0)
+
     if sma_1:
-        sma_1_plot = sma(df["Adj Close"], sma_1_periods)
-        ax1.plot(df.index, sma_1_plot, color=SMA_1_COLOR, alpha=0.8, linewidth=2, label=f"SMA({sma_1_periods})")
+        ax1.plot(df.index[price_idx], sma_1_plot[price_idx], color=SMA_1_COLOR, alpha=0.8, linewidth=2, label=f"SMA({sma_1_periods})")
 
     if sma_2:
-        sma_2_plot = sma(df["Adj Close"], sma_2_periods)
-        ax1.plot(df.index, sma_2_plot, color=SMA_2_COLOR, alpha=0.8, linewidth=2, label=f"SMA({sma_2_periods})")
+        ax1.plot(df.index[price_idx], sma_2_plot[price_idx], color=SMA_2_COLOR, alpha=0.8, linewidth=2, label=f"SMA({sma_2_periods})")
 
     ax1.legend(facecolor="#121212", labelcolor="white")
 
+    st.pyplot(fig)
+
+    # Both panes get the price chart's date range, so all three line up.
+    x = alt.X("Date:T", scale=alt.Scale(domain=[ts.value // 10**6 for ts in df.index[[0, -1]]]), title=None)
+
     if rsi_1:
-        ax2 = plt.subplot(14, 1, (9,10), sharex=ax1)
-        ax2.plot(df.index, df[f"RSI ({rsi_periods})"], color="lightgray")
-        ax2.set_title(f"RSI ({rsi_periods})", color="white")
-        ax2.grid(True, color="#555555")
-        ax2.set_facecolor("black")
-        ax2.tick_params(axis="x", colors="#121212")
-        ax2.tick_params(axis="y", colors="white")
-        ax2.set_yticks(ticks=[0,30,70,100])
-        ax2.axhline(1, linestyle="--", alpha=0.5, color=RSI_0_100_COLOR)
-        ax2.axhline(99, linestyle="--", alpha=0.5, color=RSI_0_100_COLOR)
-        ax2.axhline(15, linestyle="--", alpha=0.5, color=RSI_15_85_COLOR)
-        ax2.axhline(85, linestyle="--", alpha=0.5, color=RSI_15_85_COLOR)
-        ax2.axhline(30, linestyle="--", alpha=0.5, color=RSI_30_70_COLOR)
-        ax2.axhline(70, linestyle="--", alpha=0.5, color=RSI_30_70_COLOR)
+        rsi_column = f"RSI ({rsi_periods})"
+        rsi_idx = downsample(rsi_data.to_numpy(dtype=np.float64))
+        rsi_frame = rsi_data.iloc[rsi_idx].rename_axis("Date").reset_index(name="RSI")
+        line = alt.Chart(rsi_frame).mark_line(clip=True).encode(
+            x=x, y=alt.Y("RSI:Q", scale=alt.Scale(domain=[0,100]), axis=alt.Axis(values=[0,30,70,100]), title=None))
+        guides = pd.DataFrame({"level": [1,99,15,85,30,70],
+                               "color": [RSI_0_100_COLOR]*2 + [RSI_15_85_COLOR]*2 + [RSI_30_70_COLOR]*2})
+        rules = alt.Chart(guides).mark_rule(strokeDash=[4,4], opacity=0.5).encode(
+            y="level:Q", color=alt.Color("color:N", scale=None))
+        st.caption(rsi_column)
+        st.altair_chart((line + rules).properties(height=120), use_container_width=True)
 
     if volume:
-        if rsi_1:
-            ax3 = plt.subplot(14, 1, (12,14), sharex=ax1)
-        else:
-            ax3 = plt.subplot(14, 1, (9,10), sharex=ax1)
-        ax3.bar(df.index, df["Volume"], color="white")
-        ax3.set_title("Volume", color="white")
-        ax3.grid(True, color="#555555")
-        ax3.set_facecolor("black")
-        ax3.tick_params(axis="x", colors="white")
-        ax3.tick_params(axis="y", colors="white")
-    
-    return st.pyplot()
-
-
-# Creating pie charts for major holders.
-def plot_major_holders(major_holders): 
-    ptc_insiders = float((major_holders[0][0])[:-1])
-    ptc_shares_institutions = float((major_holders[0][1])[:-1])
-    ptc_float_institutions = float((major_holders[0][2])[:-1])
-
-    plt.figure(figsize=(12,8))
-
-    ax1 = plt.subplot(1, 5, 1)
-    ax1.pie([ptc_insiders,100-ptc_insiders], colors=["black","white"], 
-            labels=[major_holders[0][0],None], counterclock=False, startangle=90, wedgeprops={"edgecolor":"k"})
-    ax1.set_title("% of Shares Held by Insiders")
-
-    ax2 = plt.subplot(1, 5, 3)
-    ax2.pie([ptc_shares_institutions,100-ptc_shares_institutions], colors=["black","white"],
-            labels=[major_holders[0][1],None], counterclock=False, startangle=90, wedgeprops={"edgecolor":"k"})
-    ax2.set_title("% of Shares Held by Institutions")
-
-    ax3 = plt.subplot(1, 5, 5)
-    ax3.pie([ptc_float_institutions,100-ptc_float_institutions], colors=["black","white"], 
-            labels=[major_holders[0][2],None], counterclock=False, startangle=90, wedgeprops={"edgecolor":"k"})
-    ax3.set_title("% of Float Held by Institutions")
-
-    return st.pyplot()
+        volume_idx = downsample(df["Volume"].to_numpy(dtype=np.float64), edges=False)
+        volume_frame = df[["Volume"]].iloc[volume_idx].rename_axis("Date").reset_index()
+        bars = alt.Chart(volume_frame).mark_bar(clip=True).encode(x=x, y=alt.Y("Volume:Q", title=None))
+        st.caption("Volume")
+        st.altair_chart(bars.properties(height=120), use_container_width=True)
+
+
+# Creating stacked bar chart for major holders, rendered once per ticker to a base64 encoded SVG.
+@st.cache_data(ttl=3600, show_spinner=False)
+def _holders_svg(ticker, major_holders):
+    from matplotlib.figure import Figure
+    rows = [0,1,2]
+
+    fig = Figure(figsize=(12,3), dpi=DPI)
+    ax = fig.add_subplot()
+    ax.barh(rows, major_holders, color="black", edgecolor="k")
+    ax.barh(rows, 100-major_holders, left=major_holders, color="white", edgecolor="k")
+    for row, ptc in zip(rows, major_holders):
+        ax.text(101, row, f"{ptc:.2f}%", va="center")
+    ax.set_xlim(0, 100)
+    ax.set_yticks(rows)
+    ax.set_yticklabels(["% of Shares Held by Insiders", "% of Shares Held by Institutions", "% of Float Held by Institutions"])
+    ax.invert_yaxis()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="svg", bbox_inches="tight")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+# Showing the major holders chart as an <img>, so the SVG's styles and ids stay out of the page.
+def plot_major_holders(ticker, major_holders):
+    svg = _holders_svg(ticker, major_holders)
+    st.markdown(f'<img src="data:image/svg+xml;base64,{svg}" style="max-width:100%">', unsafe_allow_html=True)
 
 
 # Setting variables.
 URL = "https://en.wikipedia.org/wiki/DAX"
-TABEL_NUM = 3
-TICKERS = load_tickers(URL, TABEL_NUM)
+TICKERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tickers.pkl")
+FIGSIZE = (12,5)
+DPI = 100
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close"]
+INSTITUTIONAL_HOLDERS_COLUMNS = ["Holder", "Shares", "Date Reported", "% Out"]
+INTERVALS = {"1 day": "1d", "1 week": "1wk", "1 month": "1mo"}
+FIG_WIDTH_PX = FIGSIZE[0] * DPI
 SMA_1_COLOR = "#ffd700"
 SMA_2_COLOR = "#2069e0"
 RSI_30_70_COLOR = "#00ff00"
@@ -177,16 +239,16 @@ rsi_periods = 14
 
 # Streamlit page config.
 st.set_page_config(layout="wide", page_title="DAX Stock Visualizer", page_icon="🚀")
-st.set_option('deprecation.showPyplotGlobalUse', False)
 col1 , col2 = st.columns((1,10))
 
 # Sidebar config.
 st.sidebar.title("DAX Stock Visualizer")
-stock = st.sidebar.selectbox("Select stock:", TICKERS.index)
-ticker = TICKERS["Ticker"][str(stock)]
+tickers = get_tickers()
+stock = st.sidebar.selectbox("Select stock:", tickers.index)
+ticker = tickers["Ticker"][str(stock)]
 start_date = st.sidebar.date_input("Select start date:", value=pd.to_datetime("2019-01-01"), min_value=pd.to_datetime("2000-01-01"))
 end_date = st.sidebar.date_input("Select end date:", min_value=start_date)
-interval = st.sidebar.selectbox("Select interval:", ["1 day", "1 week", "1 month"], index = 0)
+interval = st.sidebar.selectbox("Select interval:", list(INTERVALS), index = 0)
 sma_1 = st.sidebar.checkbox("Simple Moving Average (SMA)", value=True, key=1)
 sma_1_periods = st.sidebar.slider("Pick number of periods:", min_value=5, max_value=200, value=50)
 sma_2 = st.sidebar.checkbox("Simple Moving Average (SMA)", value=True, key=2)
@@ -195,11 +257,15 @@ rsi_1 = st.sidebar.checkbox("Relative Strength Indxex (RSI)", value=True)
 rsi_periods = st.sidebar.slider("Pick number of periods:", min_value=5, max_value=50, value=14)
 volume = st.sidebar.checkbox("Volume", value=True)
 
-# Converting interval and loading Data.
+# Converting interval and loading Data, price and holders requests are sent concurrently.
+# The workers get this run's ScriptRunContext, so the cached loaders run as part of it.
 converted_interval = convert_interval(interval)
-price_data = load_price_data(ticker, start_date, end_date, converted_interval)
-institutional_holders = load_institutional_holders(ticker)
-major_holders  = load_major_holders(ticker)
+with ThreadPoolExecutor(max_workers=2, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())) as executor:
+    price_future = executor.submit(load_price_data, ticker, start_date, end_date, converted_interval)
+    holders_future = executor.submit(load_holders, ticker)
+    price_data = price_future.result()
+    major_holders, institutional_holders = holders_future.result()
+rsi_data = load_rsi(ticker, start_date, end_date, converted_interval, rsi_periods) if rsi_1 else None
 
 
 # Plotting data to column 2 of main page.
@@ -207,10 +273,10 @@ with col2:
     st.title(f"{stock} ({ticker})")
 
     st.subheader("Price Chart")
-    plot_price(price_data)
+    plot_price(price_data, rsi_data)
 
     st.subheader("Major Holders")
-    plot_major_holders(major_holders)
+    plot_major_holders(ticker, major_holders)
 
     st.subheader("Institutional Holders")
     institutional_holders
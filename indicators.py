@@ -0,0 +1,77 @@
+# Numba kernels for the DAX Stock Visualizer.
+# Kept in their own module, because Streamlit re-runs the main script on every widget change
+# but imports this module only once per process, so the kernels are compiled or loaded from cache once.
+
+
+import numpy as np
+from numba import njit
+
+
+# RSI kernel: delta, up/down, both EMAs (com=periods-1, adjust=False) and RSI transform in a single pass.
+# Matches the pandas ewm() version: first value is NaN, RSI is 100 when there were no down moves.
+@njit("float64[:](float32[::1], int64)", cache=True)
+def rsi_kernel(x, periods):
+    n = x.size
+    out = np.full(n, np.nan)
+    alpha = 1.0 / periods
+    ema_up = 0.0
+    ema_down = 0.0
+    for i in range(1, n):
+        delta = x[i] - x[i-1]
+        up = delta if delta > 0.0 else 0.0
+        down = -delta if delta < 0.0 else 0.0
+        if i == 1:
+            ema_up = up
+            ema_down = down
+        else:
+            ema_up = alpha*up + (1.0-alpha)*ema_up
+            ema_down = alpha*down + (1.0-alpha)*ema_down
+        if ema_down > 0.0:
+            out[i] = 100.0 - (100.0/(1.0 + ema_up/ema_down))
+        elif ema_up > 0.0:
+            out[i] = 100.0
+    return out
+
+
+# Calculating two simple moving averages(SMA) from one prefix sum, a period of 0 skips that SMA.
+@njit("UniTuple(float64[:], 2)(float32[::1], int64, int64)", cache=True)
+def dual_sma(x, p1, p2):
+    n = x.size
+    cs = np.empty(n+1)
+    cs[0] = 0.0
+    for i in range(n):
+        cs[i+1] = cs[i] + x[i]
+    out1 = np.full(n, np.nan)
+    out2 = np.full(n, np.nan)
+    for i in range(n):
+        if p1 > 0 and i >= p1-1:
+            out1[i] = (cs[i+1] - cs[i+1-p1]) / p1
+        if p2 > 0 and i >= p2-1:
+            out2[i] = (cs[i+1] - cs[i+1-p2]) / p2
+    return out1, out2
+
+
+# M4 downsampling: keeping first, last, min and max of each x-bin, so the line looks the same at canvas resolution.
+# Without edges only min and max are kept, which is enough for bar charts.
+@njit(["int64[:](float32[::1], int64, boolean)", "int64[:](float64[::1], int64, boolean)"], cache=True)
+def m4(y, n_bins, edges):
+    n = y.size
+    keep = np.zeros(n, dtype=np.bool_)
+    for b in range(n_bins):
+        start = b * n // n_bins
+        stop = (b+1) * n // n_bins
+        if start >= stop:
+            continue
+        lo = start
+        hi = start
+        for i in range(start+1, stop):
+            if y[i] < y[lo]:
+                lo = i
+            if y[i] > y[hi]:
+                hi = i
+        keep[lo] = True
+        keep[hi] = True
+        if edges:
+            keep[start] = True
+            keep[stop-1] = True
+    return np.nonzero(keep)[0]